@@ -5,35 +5,315 @@ Robust, production-ready speech-to-text using OpenAI Whisper with VAD
 """
 
 import asyncio
-import json
+import atexit
+import importlib.util
+import itertools
 import queue
 import threading
 import collections
 import logging
+import logging.handlers
 import os
-from typing import Deque, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
 
+import ctranslate2
+import msgpack
 import numpy as np
+import orjson
 import webrtcvad
-import whisper
+from faster_whisper import WhisperModel
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_compression_ratio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 import uvicorn
 
 # Setup logging
 debug_mode = os.getenv("WHISPER_DEBUG", "false").lower() == "true"
-log_level = logging.DEBUG if debug_mode else logging.INFO
+log_level_name = os.getenv("LOG_LEVEL", "info").upper()
+log_level = logging.DEBUG if debug_mode else logging.getLevelName(log_level_name)
+if not isinstance(log_level, int):
+    log_level = logging.INFO
+
+# Relative to the working directory, as documented in the README
+os.makedirs("logs", exist_ok=True)
+
+# Records are queued and written by a listener thread so log I/O never blocks the event loop
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue,
+    logging.FileHandler('logs/server.log', mode='a'),
+    logging.StreamHandler()
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 logging.basicConfig(
     level=log_level,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/server.log', mode='a'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
 logger = logging.getLogger(__name__)
 
+class NpRingBuffer:
+    """Fixed-capacity ring buffer of audio samples backed by a numpy array.
+    
+    Writes wrap with at most two slice copies; once full, the oldest samples
+    are overwritten. Not thread-safe: push and read from a single thread.
+    """
+    
+    __slots__ = ("buf", "capacity", "scale", "w", "r")
+    
+    def __init__(self, capacity: int, dtype=np.float32, scale: Optional[float] = None):
+        """
+        Initialize the ring buffer.
+        
+        Args:
+            capacity: Maximum number of samples held
+            dtype: Sample dtype of the backing array
+            scale: Optional factor applied to samples as they are written
+        """
+        self.buf = np.empty(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.scale = None if scale is None else self.buf.dtype.type(scale)
+        self.w = 0  # Total samples written
+        self.r = 0  # Total samples consumed
+    
+    def __len__(self) -> int:
+        return self.w - self.r
+    
+    def push_slice(self, arr: np.ndarray):
+        """Append samples, overwriting the oldest ones when full."""
+        n = arr.size
+        if n > self.capacity:
+            arr = arr[-self.capacity:]
+            self.w += n - self.capacity
+            n = self.capacity
+        
+        start = self.w % self.capacity
+        first = min(n, self.capacity - start)
+        self._write(self.buf[start:start + first], arr[:first])
+        self._write(self.buf[:n - first], arr[first:])
+        
+        self.w += n
+        if self.w - self.r > self.capacity:
+            self.r = self.w - self.capacity
+    
+    def _write(self, dst: np.ndarray, src: np.ndarray):
+        """Copy src into dst, converting and scaling in a single ufunc pass."""
+        if self.scale is None:
+            np.copyto(dst, src, casting='unsafe')
+        else:
+            np.multiply(src, self.scale, out=dst, dtype=dst.dtype, casting='unsafe')
+    
+    def peek_last(self, n: int) -> np.ndarray:
+        """Return the newest n samples; a view unless the window wraps."""
+        n = min(n, len(self))
+        start = (self.w - n) % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return self.buf[start:end]
+        return np.concatenate((self.buf[start:], self.buf[:end - self.capacity]))
+    
+    def clear(self):
+        """Discard all buffered samples and rewind to the start of the ring."""
+        self.r = self.w = 0
+
+# Maximum audio frames queued per session before the WebSocket reader waits for the worker
+MAX_PENDING_CHUNKS = 128
+
+# Seconds without new audio after which a pending speech segment is transcribed
+IDLE_FLUSH_SECONDS = 0.5
+
+# Segments whose RMS level (normalized float audio) is below this are treated as silence
+SILENCE_RMS = 0.005
+
+# Maximum number of segments, across all sessions, decoded together in one forward pass
+MAX_INFERENCE_BATCH = 8
+
+# faster-whisper's transcribe() defaults: text is dropped as silence when the no-speech
+# probability is above this and the average token log-probability is below LOG_PROB_THRESHOLD
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+
+# Text whose zlib compression ratio exceeds this is a repetition loop (transcribe()'s default)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+# Decoding budget per second of audio, well above normal speech, so a looping decode stops
+# early instead of holding the shared inference thread for Whisper's full 448 tokens
+MAX_TOKENS_PER_SECOND = 12
+MIN_NEW_TOKENS = 16
+
+# Whisper models are loaded once per process and shared by all sessions
+_models: Dict[str, WhisperModel] = {}
+_models_lock = threading.Lock()
+
+# Tokenizer and decoder prompt for each loaded model, keyed by id(model)
+_prompts: Dict[int, Tuple[Tokenizer, List[int]]] = {}
+
+# Inference runs on one dedicated thread so the event loop never blocks on Whisper;
+# CTranslate2 already spreads each call across cpu_threads, so calls run one at a time
+_inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+def _default_compute_type(device: str) -> str:
+    """Pick a reduced-precision compute type: FP16 on CUDA, INT8 on CPU (CTranslate2 has no CPU BF16 kernels)."""
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    if device == "cuda":
+        supported = ctranslate2.get_supported_compute_types(device)
+        for compute_type in ("float16", "int8_float16"):
+            if compute_type in supported:
+                return compute_type
+    return "int8"
+
+def _transcribe_batch(model: WhisperModel, segments: List[np.ndarray]) -> List[str]:
+    """Transcribe several normalized float32 segments (each up to 30s) in one batched forward pass."""
+    try:
+        tokenizer, prompt = _prompts[id(model)]
+        
+        # Pad every log-mel window to Whisper's 30s frame count so segments stack into one batch
+        n_frames = model.feature_extractor.nb_max_frames
+        mels = []
+        for audio in segments:
+            mel = model.feature_extractor(audio)[:, :n_frames]
+            mels.append(np.pad(mel, ((0, 0), (0, n_frames - mel.shape[-1]))))
+        features = ctranslate2.StorageView.from_array(np.ascontiguousarray(np.stack(mels), dtype=np.float32))
+        
+        # The batch shares one length limit, sized for its longest segment
+        seconds = max(len(audio) for audio in segments) / 16000
+        max_new_tokens = max(MIN_NEW_TOKENS, int(seconds * MAX_TOKENS_PER_SECOND))
+        results = model.model.generate(
+            features,
+            [prompt] * len(segments),
+            beam_size=1,
+            max_length=min(model.max_length, len(prompt) + max_new_tokens),
+            return_scores=True,
+            return_no_speech_prob=True
+        )
+        texts = []
+        for result in results:
+            tokens = result.sequences_ids[0]
+            # The score is length-normalized; recover the average log-probability as transcribe() does
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+                logger.debug(f"Dropping likely non-speech (no_speech_prob={result.no_speech_prob:.2f})")
+                texts.append("")
+                continue
+            text = tokenizer.decode(tokens).strip()
+            compression_ratio = get_compression_ratio(text)
+            if compression_ratio > COMPRESSION_RATIO_THRESHOLD:
+                logger.debug(f"Dropping repetitive decode (compression_ratio={compression_ratio:.2f})")
+                texts.append("")
+                continue
+            logger.info(f"Transcription: '{text}'")
+            texts.append(text)
+        return texts
+        
+    except Exception as e:
+        logger.error(f"Transcription error: {e}")
+        return [""] * len(segments)
+
+def get_model(model_name: str) -> WhisperModel:
+    """Return the shared faster-whisper (CTranslate2) model, loading it on first use."""
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            device = os.getenv("WHISPER_DEVICE", "auto")
+            compute_type = os.getenv("WHISPER_COMPUTE_TYPE") or _default_compute_type(device)
+            # Split the cores between worker processes so WORKERS=N does not oversubscribe the CPU
+            workers = max(1, int(os.getenv("WORKERS", "1")))
+            cpu_threads = int(os.getenv("WHISPER_CPU_THREADS") or max(1, (os.cpu_count() or 1) // workers))
+            logger.info(f"Loading Whisper model: {model_name} (device={device}, compute_type={compute_type}, cpu_threads={cpu_threads})")
+            model = WhisperModel(
+                model_name,
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+                num_workers=1,
+                download_root=os.getenv("WHISPER_CACHE_DIR")
+            )
+            tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language="en")
+            # Only the text is used; skip timestamp tokens
+            _prompts[id(model)] = (tokenizer, list(tokenizer.sot_sequence) + [tokenizer.no_timestamps])
+            
+            # One throwaway inference so the first real segment does not pay warm-up costs
+            _transcribe_batch(model, [np.zeros(16000 * 2, dtype=np.float32)])
+            
+            _models[model_name] = model
+            logger.info(f"Whisper model {model_name} loaded successfully")
+        return model
+
+class InferenceBatcher:
+    """Collects segments from every session on one event loop and transcribes them in shared batched passes."""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_batch: int):
+        self.loop = loop
+        self.max_batch = max_batch
+        self.pending: Deque[tuple] = collections.deque()
+        self._task = loop.create_task(self._run())  # Referenced so it is not garbage-collected
+    
+    async def transcribe(self, model: WhisperModel, audio: np.ndarray) -> str:
+        """Queue one segment for the next batch and wait for its text."""
+        future = self.loop.create_future()
+        self.pending.append((model, audio, future))
+        return await future
+    
+    async def _run(self):
+        """Decode pending segments, up to max_batch at a time, until none are left."""
+        try:
+            while self.pending:
+                # No extra wait: segments that arrive while a batch is decoding form the next one
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_batch))]
+                
+                # Sessions whose worker was cancelled no longer need their text
+                groups: Dict[int, list] = {}
+                for item in batch:
+                    if not item[2].done():
+                        groups.setdefault(id(item[0]), []).append(item)
+                
+                for items in groups.values():
+                    await self._decode(items)
+        finally:
+            # Unblock anything still queued if this task is cancelled (e.g. loop shutdown)
+            for _model, _audio, future in self.pending:
+                future.cancel()
+            _batchers.pop(self.loop, None)
+    
+    async def _decode(self, items: list):
+        """Transcribe one model's segments together and resolve their futures."""
+        futures = [future for _model, _audio, future in items]
+        logger.debug(f"Transcribing batch of {len(items)} segments")
+        try:
+            texts = await self.loop.run_in_executor(
+                _inference_executor, _transcribe_batch, items[0][0], [audio for _model, audio, _future in items]
+            )
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Batch transcription error: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for future, text in zip(futures, texts):
+            if not future.done():
+                future.set_result(text)
+
+# Batchers by event loop (one per worker process when served); each lives only while it has work
+_batchers: Dict[asyncio.AbstractEventLoop, InferenceBatcher] = {}
+
+async def _transcribe_segment(model: WhisperModel, audio: np.ndarray) -> str:
+    """Transcribe one segment as part of the next batch on the running event loop."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = InferenceBatcher(loop, MAX_INFERENCE_BATCH)
+    return await batcher.transcribe(model, audio)
+
 class WhisperWebSocketTranscriber:
     """Real-time WebSocket transcriber using OpenAI Whisper with VAD."""
     
@@ -48,60 +328,62 @@ class WhisperWebSocketTranscriber:
         """
         logger.info(f"Initializing WhisperWebSocketTranscriber with model: {model_name}")
         
-        # Load Whisper model
-        logger.info(f"Loading Whisper model: {model_name}")
-        self.model = whisper.load_model(model_name)
-        logger.info(f"Whisper model {model_name} loaded successfully")
+        # Shared Whisper model
+        self.model = get_model(model_name)
         
         # Audio processing parameters
         self.sr = sample_rate
-        self.chunk_size = int(sample_rate * chunk_ms / 1000)
-        self.chunk_ms = chunk_ms
         
         # VAD setup
         self.vad = webrtcvad.Vad(2)  # Aggressiveness level 2 (0-3)
         logger.info("VAD initialized with aggressiveness level 2")
         
         # Audio buffering
-        self.audio_queue = queue.Queue()
+        # Bounded so a transcriber that falls behind pushes back on the socket reader
+        self.audio_queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_CHUNKS)
         self.speech_flags: Deque[bool] = collections.deque(maxlen=30)
         self.min_segment_ms = 500  # Minimum speech segment duration
-        self.current_segment = []
+        # Speech segment as normalized float32, converted once as chunks arrive
+        self.current_segment = NpRingBuffer(sample_rate * 30, scale=1.0 / 32768.0)  # Whisper's 30s window
+        self.segment_chunks = 0
+        # Last text sent; a plain != is kept for de-duplication since CPython
+        # compares lengths before contents and caches str hashes anyway
         self.last_emit = ""
         
-        # Threading control
-        self._running = False
-        self._worker_thread = None
+        # Worker task control
+        self._task: Optional[asyncio.Task] = None
         
         logger.info(f"Transcriber initialized - Sample rate: {sample_rate}Hz, Chunk size: {chunk_ms}ms")
 
-    def put_bytes(self, data: bytes):
-        """Add audio bytes to the processing queue."""
-        try:
-            pcm = np.frombuffer(data, dtype=np.int16)
-            if pcm.size > 0:
-                self.audio_queue.put(pcm)
-                logger.debug(f"Added {len(data)} bytes ({pcm.size} samples) to queue")
-        except Exception as e:
-            logger.error(f"Error processing audio bytes: {e}")
+    async def put_bytes(self, data: bytes):
+        """Add raw 16-bit PCM bytes to the processing queue, waiting while it is full."""
+        # Decode in place; a trailing odd byte is ignored rather than raising
+        n = len(data) // 2
+        if n > 0:
+            await self.audio_queue.put(np.frombuffer(data, dtype=np.int16, count=n))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Added {len(data)} bytes ({n} samples) to queue")
 
-    def start(self, send_fn):
-        """Start the transcription worker thread."""
-        if self._running:
+    def start(self, results: asyncio.Queue):
+        """
+        Start the transcription worker task on the running event loop.
+        
+        Args:
+            results: Queue receiving transcribed text
+        """
+        if self._task is not None:
             logger.warning("Transcriber already running")
             return
             
-        self._running = True
-        self._worker_thread = threading.Thread(target=self._worker, args=(send_fn,), daemon=True)
-        self._worker_thread.start()
-        logger.info("Transcription worker thread started")
+        self._task = asyncio.create_task(self._worker(results))
+        logger.info("Transcription worker task started")
 
     def stop(self):
-        """Stop the transcription worker thread."""
-        self._running = False
-        if self._worker_thread:
-            self._worker_thread.join(timeout=1.0)
-        logger.info("Transcription worker thread stopped")
+        """Stop the transcription worker task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        logger.info("🛑 Transcription worker task stopped")
 
     def _is_speech(self, chunk: np.ndarray) -> bool:
         """Detect if audio chunk contains speech using VAD."""
@@ -111,30 +393,45 @@ class WhisperWebSocketTranscriber:
             logger.debug(f"VAD error: {e}")
             return False
 
-    def _transcribe(self, pcm16: np.ndarray) -> str:
-        """Transcribe audio using Whisper."""
+    async def _flush_segment(self, results: asyncio.Queue):
+        """Transcribe the buffered speech segment, queue any new text and clear the segment."""
         try:
-            # Convert to float32 and normalize
-            audio = pcm16.astype(np.float32) / 32767.0
-            
-            # Transcribe with Whisper
-            result = self.model.transcribe(
-                audio, 
-                language="en", 
-                task="transcribe", 
-                fp16=False
-            )
+            # Read the buffered segment as a zero-copy view; it stays valid while the
+            # batch containing it is transcribed because only this task pushes into the ring
+            audio = self.current_segment.peek_last(len(self.current_segment))
+            logger.debug(f"Segment size: {len(audio)} samples")
             
-            text = result["text"].strip()
-            logger.info(f"Transcription: '{text}'")
-            return text
+            # Skip inference on near-silent segments; Whisper has nothing useful to say about them
+            rms = float(np.sqrt(np.dot(audio, audio) / len(audio))) if len(audio) else 0.0
+            if rms < SILENCE_RMS:
+                logger.debug(f"Segment RMS {rms:.4f} below {SILENCE_RMS}, skipping transcription")
+                text = ""
+            else:
+                # Transcribe the segment
+                logger.debug("Starting transcription...")
+                text = await _transcribe_segment(self.model, audio)
+            logger.debug(f"Transcription result: '{text}'")
             
+            if text and text != self.last_emit:
+                # Hand the transcription to the sender
+                logger.debug("Queueing transcription for WebSocket...")
+                await results.put(text)
+                self.last_emit = text
+                logger.info(f"📝 Transcription: '{text}'")
+            else:
+                logger.debug("No transcription or duplicate text, skipping send")
         except Exception as e:
-            logger.error(f"Transcription error: {e}")
-            return ""
+            logger.error(f"Error processing speech segment: {e}")
+            import traceback
+            logger.error(f"Process segment traceback: {traceback.format_exc()}")
+        
+        # Clear the segment for next speech
+        self.current_segment.clear()
+        self.segment_chunks = 0
+        logger.debug("Cleared speech segment")
 
-    def _worker(self, send_fn):
-        """Main worker thread for processing audio and transcription."""
+    async def _worker(self, results: asyncio.Queue):
+        """Main worker task for processing audio; inference runs on the Whisper executor."""
         logger.info("🎤 Starting audio processing worker")
         
         # Debug mode: bypass VAD for testing
@@ -147,29 +444,41 @@ class WhisperWebSocketTranscriber:
         
         recording_started = False
         
-        while self._running:
+        while True:
             try:
-                # Get audio chunk from queue
-                logger.debug("Worker: waiting for audio chunk...")
-                chunk = self.audio_queue.get(timeout=0.1)
-                logger.debug(f"Worker: received chunk of {len(chunk)} samples")
+                # Per-chunk debug messages are only formatted when they will be emitted
+                log_debug = logger.isEnabledFor(logging.DEBUG)
+                
+                # Wait for the next audio chunk; a pending segment is flushed once the stream goes idle
+                if log_debug:
+                    logger.debug("Worker: waiting for audio chunk...")
+                if len(self.current_segment) * 1000 // self.sr >= self.min_segment_ms:
+                    try:
+                        chunk = await asyncio.wait_for(self.audio_queue.get(), timeout=IDLE_FLUSH_SECONDS)
+                    except asyncio.TimeoutError:
+                        logger.debug("Audio stream idle, flushing pending segment")
+                        await self._flush_segment(results)
+                        continue
+                else:
+                    chunk = await self.audio_queue.get()
+                if log_debug:
+                    logger.debug(f"Worker: received chunk of {len(chunk)} samples")
                 
                 # Mark recording as started when we receive first chunk
                 if not recording_started:
                     logger.info("🎙️ Recording started")
                     recording_started = True
                 
-                logger.debug("About to check debug mode...")
                 try:
                     if debug_mode:
                         # Debug mode: treat all audio as speech
                         speech = True
-                        logger.debug("DEBUG: Treating chunk as speech")
                     else:
                         # Run VAD on chunk
                         speech = self._is_speech(chunk)
                     
-                    logger.debug(f"Speech detection result: {speech}")
+                    if log_debug:
+                        logger.debug(f"Speech detection result: {speech}")
                     
                     self.speech_flags.append(speech)
                 except Exception as e:
@@ -181,174 +490,221 @@ class WhisperWebSocketTranscriber:
                 
                 if speech:
                     # Add to current speech segment
-                    self.current_segment.append(chunk)
-                    logger.debug("Speech detected, adding to segment")
-                    logger.debug(f"Current segment size: {len(self.current_segment)} chunks")
+                    self.current_segment.push_slice(chunk)
+                    self.segment_chunks += 1
                     
                     # In debug mode, process speech segments immediately after a certain size
                     # Process immediately if segment is large enough (either by chunk count or total samples)
-                    total_samples = sum(len(chunk) for chunk in self.current_segment)
-                    logger.debug(f"DEBUG MODE: Segment size: {len(self.current_segment)} chunks, Total samples: {total_samples}")
-                    if debug_mode and (len(self.current_segment) >= 10 or total_samples >= 16000):  # Process after 10 chunks or 1 second of audio
+                    total_samples = len(self.current_segment)
+                    if log_debug:
+                        logger.debug(f"Speech added to segment: {self.segment_chunks} chunks, {total_samples} samples")
+                    if debug_mode and (self.segment_chunks >= 10 or total_samples >= 16000):  # Process after 10 chunks or 1 second of audio
                         logger.debug("DEBUG MODE: Processing speech segment immediately")
-                        try:
-                            # Calculate segment duration
-                            dur_ms = len(self.current_segment) * 1000 * self.chunk_size // self.sr
-                            logger.debug(f"DEBUG MODE: Processing speech segment: {dur_ms}ms")
-                            
-                            # Concatenate all chunks in the segment
-                            logger.debug(f"Concatenating {len(self.current_segment)} chunks...")
-                            pcm = np.concatenate(self.current_segment)
-                            logger.debug(f"Concatenated PCM size: {len(pcm)} samples")
-                            
-                            # Transcribe the segment
-                            logger.debug("Starting transcription...")
-                            text = self._transcribe(pcm)
-                            logger.debug(f"Transcription result: '{text}'")
-                            
-                            if text and text != self.last_emit:
-                                # Send transcription via WebSocket
-                                try:
-                                    logger.debug("Sending transcription via WebSocket...")
-                                    asyncio.run(send_fn(text))
-                                    self.last_emit = text
-                                    logger.info(f"📝 Transcription: '{text}'")
-                                except Exception as e:
-                                    logger.error(f"Error sending transcription: {e}")
-                                    import traceback
-                                    logger.error(f"Send transcription traceback: {traceback.format_exc()}")
-                            else:
-                                logger.debug("No transcription or duplicate text, skipping send")
-                        except Exception as e:
-                            logger.error(f"Error processing speech segment: {e}")
-                            import traceback
-                            logger.error(f"Process segment traceback: {traceback.format_exc()}")
-                        
-                        # Clear the segment for next speech
-                        self.current_segment.clear()
-                        logger.debug("Cleared speech segment")
+                        dur_ms = total_samples * 1000 // self.sr
+                        logger.debug(f"DEBUG MODE: Processing speech segment: {dur_ms}ms")
+                        await self._flush_segment(results)
                     
                     continue
                 
                 # Check if we just finished speaking (silence detected)
-                logger.debug(f"Checking speech flags: {len(self.speech_flags)} flags, speech ratio: {sum(self.speech_flags) / len(self.speech_flags) if self.speech_flags else 0}")
-                if self.current_segment and sum(self.speech_flags) / len(self.speech_flags) < 0.3:
+                if log_debug:
+                    logger.debug(f"Checking speech flags: {len(self.speech_flags)} flags, speech ratio: {sum(self.speech_flags) / len(self.speech_flags) if self.speech_flags else 0}")
+                if len(self.current_segment) and sum(self.speech_flags) / len(self.speech_flags) < 0.3:
                     # Calculate segment duration
-                    dur_ms = len(self.current_segment) * 1000 * self.chunk_size // self.sr
+                    dur_ms = len(self.current_segment) * 1000 // self.sr
                     logger.debug(f"Silence detected, segment duration: {dur_ms}ms")
                     
                     if dur_ms >= self.min_segment_ms:
                         logger.debug(f"Processing speech segment: {dur_ms}ms")
-                        
-                        try:
-                            # Concatenate all chunks in the segment
-                            logger.debug(f"Concatenating {len(self.current_segment)} chunks...")
-                            pcm = np.concatenate(self.current_segment)
-                            logger.debug(f"Concatenated PCM size: {len(pcm)} samples")
-                            
-                            # Transcribe the segment
-                            logger.debug("Starting transcription...")
-                            text = self._transcribe(pcm)
-                            logger.debug(f"Transcription result: '{text}'")
-                            
-                            if text and text != self.last_emit:
-                                # Send transcription via WebSocket
-                                try:
-                                    logger.debug("Sending transcription via WebSocket...")
-                                    asyncio.run(send_fn(text))
-                                    self.last_emit = text
-                                    logger.info(f"📝 Transcription: '{text}'")
-                                except Exception as e:
-                                    logger.error(f"Error sending transcription: {e}")
-                                    import traceback
-                                    logger.error(f"Send transcription traceback: {traceback.format_exc()}")
-                            else:
-                                logger.debug("No transcription or duplicate text, skipping send")
-                        except Exception as e:
-                            logger.error(f"Error processing speech segment: {e}")
-                            import traceback
-                            logger.error(f"Process segment traceback: {traceback.format_exc()}")
-                    
-                    # Clear the segment for next speech
-                    self.current_segment.clear()
-                    logger.debug("Cleared speech segment")
+                        await self._flush_segment(results)
+                    else:
+                        # Too short to transcribe; start over with the next speech
+                        self.current_segment.clear()
+                        self.segment_chunks = 0
+                        logger.debug("Cleared speech segment")
                     
-            except queue.Empty:
-                # No audio data, continue
-                continue
             except Exception as e:
-                logger.error(f"Worker thread error: {e}")
+                logger.error(f"Worker task error: {e}")
                 import traceback
-                logger.error(f"Worker thread traceback: {traceback.format_exc()}")
+                logger.error(f"Worker task traceback: {traceback.format_exc()}")
                 continue
-        
-        logger.info("🛑 Audio processing worker stopped")
+
+# Maximum number of pending transcriptions coalesced into a single WebSocket frame
+MAX_BATCH_MESSAGES = 8
+
+# Maximum transcriptions waiting for a slow client before the worker (and then the reader) waits
+MAX_PENDING_RESULTS = 256
+
+# Per-process session counter; combined with the PID so ids stay unique across workers
+_session_ids = itertools.count(1)
 
 # FastAPI application
 app = FastAPI(title="WhisperCapRover Server", version="2.0.0")
 
+# Constant HTTP bodies, serialized once instead of on every request
+_ROOT_BODY = orjson.dumps({"message": "WhisperCapRover Server", "version": "2.0.0"})
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "whispercaprover"})
+
+# Welcome message bodies minus session_id, serialized once per (model, encoding)
+_welcome_prefixes: Dict[tuple, bytes] = {}
+
+def _welcome_prefix(model_name: str, use_msgpack: bool) -> bytes:
+    """Return the cached welcome message serialized up to, but not including, its session_id."""
+    key = (model_name, use_msgpack)
+    prefix = _welcome_prefixes.get(key)
+    if prefix is None:
+        welcome_msg = {
+            "type": "connection_established",
+            "message": "Connected to WhisperCapRover Server",
+            "model": model_name,
+            "sample_rate": 16000,
+            "chunk_ms": 30,
+            "encoding": "msgpack" if use_msgpack else "json"
+        }
+        if use_msgpack:
+            # Map header counts the session_id pair appended per connection
+            packer = msgpack.Packer()
+            prefix = packer.pack_map_header(len(welcome_msg) + 1) + b"".join(
+                packer.pack(name) + packer.pack(value) for name, value in welcome_msg.items()
+            )
+        else:
+            prefix = orjson.dumps(welcome_msg)[:-1]  # strip the closing '}'
+        _welcome_prefixes[key] = prefix
+    return prefix
+
 @app.get("/")
 async def root():
     """Root endpoint with basic info."""
-    return {"message": "WhisperCapRover Server", "version": "2.0.0"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "whispercaprover"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 @app.websocket("/ws/audio")
 async def websocket_endpoint(ws: WebSocket):
     """WebSocket endpoint for real-time audio transcription."""
     await ws.accept()
-    session_id = f"session-{int(asyncio.get_event_loop().time() * 1000)}"
+    session_id = f"session-{os.getpid()}-{next(_session_ids)}"
     
     logger.info(f"🔗 New WebSocket connection: {session_id}")
     
-    # Initialize transcriber
+    # Initialize transcriber; a first-time model load runs off the event loop
     model_name = os.getenv("WHISPER_MODEL", "base")
+    await asyncio.get_running_loop().run_in_executor(None, get_model, model_name)
     transcriber = WhisperWebSocketTranscriber(model_name=model_name)
     
-    # Define sender function for WebSocket
-    async def sender(text: str):
-        """Send transcription result via WebSocket."""
-        message = {
-            "type": "transcription",
-            "text": text,
-            "is_final": True,
-            "session_id": session_id,
-            "timestamp": asyncio.get_event_loop().time()
-        }
-        await ws.send_text(json.dumps(message))
+    # Transcriptions produced by the worker task, consumed by the sender
+    results: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_RESULTS)
+    
+    # Message template reused for every transcription; only text and timestamp change
+    message = {
+        "type": "transcription",
+        "text": "",
+        "is_final": True,
+        "session_id": session_id,
+        "timestamp": 0.0
+    }
+    
+    # Cancelled by the sender if the client stops accepting frames
+    session_task = asyncio.current_task()
+    
+    # Outbound wire format: JSON text frames by default, msgpack binary frames on request
+    use_msgpack = ws.query_params.get("encoding") == "msgpack"
+    packer = msgpack.Packer()
+    
+    def dumps(obj: dict) -> bytes:
+        """Serialize a message in the session's wire format."""
+        return packer.pack(obj) if use_msgpack else orjson.dumps(obj)
+    
+    def encode(text: str, timestamp: float) -> bytes:
+        """Serialize one transcription message from the session template."""
+        message["text"] = text
+        message["timestamp"] = timestamp
+        return dumps(message)
+    
+    def encode_batch(items: List[bytes]) -> bytes:
+        """Wrap already-serialized transcription messages in a batch envelope."""
+        if use_msgpack:
+            return (
+                packer.pack_map_header(2) + packer.pack("type") + packer.pack("batch")
+                + packer.pack("items") + packer.pack_array_header(len(items)) + b"".join(items)
+            )
+        return b'{"type":"batch","items":[' + b",".join(items) + b']}'
+    
+    async def send(payload: bytes):
+        """Send a serialized message as a binary (msgpack) or text (JSON) frame."""
+        if use_msgpack:
+            await ws.send_bytes(payload)
+        else:
+            await ws.send_text(payload.decode())
+    
+    async def sender():
+        """Send transcription results via WebSocket, coalescing any backlog into one frame."""
+        loop = asyncio.get_running_loop()
+        while True:
+            texts = [await results.get()]
+            while not results.empty() and len(texts) < MAX_BATCH_MESSAGES:
+                texts.append(results.get_nowait())
+            
+            timestamp = loop.time()
+            if len(texts) == 1:
+                payload = encode(texts[0], timestamp)
+            else:
+                payload = encode_batch([encode(text, timestamp) for text in texts])
+            
+            try:
+                await send(payload)
+            except Exception as e:
+                logger.error(f"Error sending transcription in {session_id}: {e}")
+                # Nothing would drain results any more, stalling the worker and then the
+                # reader before it sees the disconnect, so end the whole session
+                session_task.cancel()
+                return
     
     # Start transcription
-    transcriber.start(sender)
+    sender_task = asyncio.create_task(sender())
+    transcriber.start(results)
     
     try:
-        # Send welcome message
-        welcome_msg = {
-            "type": "connection_established",
-            "session_id": session_id,
-            "message": "Connected to WhisperCapRover Server",
-            "model": model_name,
-            "sample_rate": 16000,
-            "chunk_ms": 30
-        }
-        await ws.send_text(json.dumps(welcome_msg))
+        # Send welcome message; only the session_id is serialized per connection
+        prefix = _welcome_prefix(model_name, use_msgpack)
+        if use_msgpack:
+            await send(prefix + packer.pack("session_id") + packer.pack(session_id))
+        else:
+            await send(prefix + b',"session_id":' + orjson.dumps(session_id) + b"}")
         logger.debug(f"Welcome message sent to {session_id}")
         
-        # Process incoming audio
+        # Process incoming audio; audio travels only as binary frames of raw PCM
         while True:
-            data = await ws.receive_bytes()
-            logger.debug(f"Received {len(data)} bytes from WebSocket")
-            transcriber.put_bytes(data)
+            frame = await ws.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("bytes")
+            if data is None:
+                logger.debug(f"Ignoring non-binary frame from {session_id}")
+                continue
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Received {len(data)} bytes from WebSocket")
+            await transcriber.put_bytes(data)
             
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket disconnected: {session_id}")
+    except asyncio.CancelledError:
+        if not sender_task.done():
+            raise  # Cancelled from outside (e.g. shutdown), not by a failed send
+        session_task.uncancel()
+        logger.info(f"🔌 Closing {session_id} after a failed send")
+        try:
+            await ws.close()
+        except Exception:
+            pass  # The connection is most likely gone already
     except Exception as e:
         logger.error(f"WebSocket error in {session_id}: {e}")
     finally:
         transcriber.stop()
+        sender_task.cancel()
         logger.info(f"🧹 Session {session_id} cleaned up")
 
 @app.get("/html", response_class=HTMLResponse)
@@ -417,8 +773,11 @@ async def get_html():
                 
                 ws.onmessage = (event) => {
                     const data = JSON.parse(event.data);
-                    if (data.type === 'transcription' && data.text) {
-                        updateTranscription(data.text);
+                    const messages = data.type === 'batch' ? data.items : [data];
+                    for (const msg of messages) {
+                        if (msg.type === 'transcription' && msg.text) {
+                            updateTranscription(msg.text);
+                        }
                     }
                 };
                 
@@ -483,14 +842,31 @@ if __name__ == "__main__":
     # Get configuration from environment variables
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
+    # Each worker process loads its own copy of the Whisper model
+    workers = int(os.getenv("WORKERS", "1"))
+    
+    # uvicorn only accepts canonical level names, not aliases such as "warn"
+    uvicorn_log_level = logging.getLevelName(log_level).lower()
+    if uvicorn_log_level not in uvicorn.config.LOG_LEVELS:
+        uvicorn_log_level = "info"
+    
+    # uvloop has no Windows build; uvicorn's "auto" falls back to the asyncio loop there
+    event_loop = "uvloop" if importlib.util.find_spec("uvloop") is not None else "auto"
     
     logger.info("Starting WhisperCapRover Server v2.0.0")
     logger.info(f"WebSocket endpoint: ws://localhost:{port}/ws/audio")
     logger.info(f"HTML client: http://localhost:{port}/html")
+    logger.info(f"Worker processes: {workers}")
     
     uvicorn.run(
         "server:app", 
         host=host, 
         port=port, 
-        log_level="info"
+        loop=event_loop,
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,  # Raw PCM barely compresses; skip per-frame zlib
+        workers=workers,
+        log_level=uvicorn_log_level,
+        access_log=False
     ) 
\ No newline at end of file
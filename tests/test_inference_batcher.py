@@ -0,0 +1,115 @@
+"""
+Tests for cross-session batched Whisper decoding
+Run from the repository root: python -m unittest discover
+"""
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from faster_whisper.feature_extractor import FeatureExtractor
+
+import server
+
+class InferenceBatcherTest(unittest.IsolatedAsyncioTestCase):
+    """InferenceBatcher groups, resolves and cleans up segments queued by concurrent sessions."""
+
+    def setUp(self):
+        self.model = object()  # Never touched: _transcribe_batch is replaced
+        self.calls = []
+
+    def fake_transcribe_batch(self, model, segments):
+        self.calls.append([len(audio) for audio in segments])
+        return [f"{len(audio)} samples" for audio in segments]
+
+    async def test_batches_concurrent_sessions(self):
+        with mock.patch.object(server, "_transcribe_batch", self.fake_transcribe_batch):
+            texts = await asyncio.gather(
+                server._transcribe_segment(self.model, np.zeros(100, dtype=np.float32)),
+                server._transcribe_segment(self.model, np.zeros(200, dtype=np.float32)),
+            )
+
+        self.assertEqual(self.calls, [[100, 200]])
+        self.assertEqual(texts, ["100 samples", "200 samples"])
+        self.assertEqual(server._batchers, {})
+
+    async def test_executor_error_fails_every_future(self):
+        def failing_batch(model, segments):
+            raise RuntimeError("decoder crashed")
+
+        with mock.patch.object(server, "_transcribe_batch", failing_batch):
+            results = await asyncio.wait_for(asyncio.gather(
+                server._transcribe_segment(self.model, np.zeros(100, dtype=np.float32)),
+                server._transcribe_segment(self.model, np.zeros(200, dtype=np.float32)),
+                return_exceptions=True
+            ), timeout=5)
+
+        self.assertEqual([type(result) for result in results], [RuntimeError, RuntimeError])
+        self.assertEqual(server._batchers, {})
+
+        # The next segment gets a fresh batcher
+        with mock.patch.object(server, "_transcribe_batch", self.fake_transcribe_batch):
+            text = await server._transcribe_segment(self.model, np.zeros(300, dtype=np.float32))
+        self.assertEqual(text, "300 samples")
+
+    async def test_cancelled_segments_are_skipped(self):
+        with mock.patch.object(server, "_transcribe_batch", self.fake_transcribe_batch):
+            cancelled = asyncio.create_task(server._transcribe_segment(self.model, np.zeros(100, dtype=np.float32)))
+            kept = asyncio.create_task(server._transcribe_segment(self.model, np.zeros(200, dtype=np.float32)))
+            await asyncio.sleep(0)  # Both segments queued, batch not yet taken
+            cancelled.cancel()
+
+            self.assertEqual(await kept, "200 samples")
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled
+
+        self.assertEqual(self.calls, [[200]])
+
+class TranscribeBatchTest(unittest.TestCase):
+    """_transcribe_batch keeps transcribe()'s no-speech and repetition guards."""
+
+    def setUp(self):
+        self.generate_kwargs = {}
+        self.results = []
+        self.model = SimpleNamespace(
+            max_length=448,
+            feature_extractor=FeatureExtractor(),
+            model=SimpleNamespace(generate=self.fake_generate),
+        )
+        texts = {1: "hello world", 2: "Thank you.", 3: "la " * 60}
+        tokenizer = SimpleNamespace(decode=lambda tokens: texts[tokens[0]])
+        server._prompts[id(self.model)] = (tokenizer, [50258, 50259, 50359, 50363])
+
+    def tearDown(self):
+        del server._prompts[id(self.model)]
+
+    def fake_generate(self, features, prompts, **kwargs):
+        self.generate_kwargs = kwargs
+        self.assertEqual(features.shape, [len(prompts), 80, 3000])
+        return self.results
+
+    @staticmethod
+    def result(token: int, score: float, no_speech_prob: float):
+        return SimpleNamespace(sequences_ids=[[token]], scores=[score], no_speech_prob=no_speech_prob)
+
+    def test_drops_non_speech_and_repetition_loops(self):
+        self.results = [
+            self.result(1, score=-0.2, no_speech_prob=0.1),
+            self.result(2, score=-3.0, no_speech_prob=0.9),  # Hallucination over noise
+            self.result(3, score=-0.1, no_speech_prob=0.1),  # Repetition loop
+        ]
+        segments = [np.zeros(16000, dtype=np.float32)] * 3
+
+        self.assertEqual(server._transcribe_batch(self.model, segments), ["hello world", "", ""])
+
+    def test_bounds_decode_length_by_segment_duration(self):
+        self.results = [self.result(1, score=-0.2, no_speech_prob=0.1)] * 2
+        segments = [np.zeros(16000, dtype=np.float32), np.zeros(16000 * 10, dtype=np.float32)]
+
+        server._transcribe_batch(self.model, segments)
+        self.assertEqual(self.generate_kwargs["max_length"], 4 + 10 * server.MAX_TOKENS_PER_SECOND)
+
+if __name__ == "__main__":
+    unittest.main()